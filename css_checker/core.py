@@ -1,23 +1,281 @@
 # Licensed with the 3-clause BSD license.  See LICENSE for details.
 
-__all__ = ["CSSChecker"]
+__all__ = ["CSSChecker", "iso_to_mjd", "parse_label", "validate_label"]
 
 import os
 import re
-import email
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Union
-from xml.etree.ElementTree import ElementTree
-
+import gzip
+import email.utils
+import shutil
+import hashlib
+import asyncio
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from xml.parsers.expat import ExpatError
+from typing import (Any, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple,
+                    Type, Union)
+
+import aiohttp
 import requests
+from lxml import etree
 from pds4_tools import pds4_read
-from pds4_tools.reader.label_objects import Label as PDS4Label
-from astropy.time import Time
+from pds4_tools.utils.exceptions import PDS4StandardsException
+from sqlalchemy.orm import Query
+
+try:
+    from pybloomfilter import BloomFilter
+except ImportError:
+    BloomFilter = None
 
 from sbsearch import SBSearch
 from sbsearch.logging import ProgressTriangle
-from .model import (Observation, Found, Ephemeris, SyncStatus,
-                    CatalinaBigelow, CatalinaKittPeak, CatalinaLemmon)
+from .model import Observation, Found, Ephemeris, SyncStatus, _TEL_TO_CLS
+
+# PDS4 label namespaces, in ElementTree tag notation
+_PDS: str = "{http://pds.nasa.gov/pds4/pds/v1}"
+_SURVEY: str = "{http://pds.nasa.gov/pds4/survey/v1}"
+
+# label elements read by CSSChecker.parse_label
+_TAG_LID: str = _PDS + "logical_identifier"
+_TAG_START: str = _PDS + "start_date_time"
+_TAG_STOP: str = _PDS + "stop_date_time"
+_TAG_TIME: str = _PDS + "Time_Coordinates"
+_TAG_RA: str = _SURVEY + "right_ascension"
+_TAG_DEC: str = _SURVEY + "declination"
+_TAG_CORNER_ID: str = _SURVEY + "corner_identification"
+_TAG_CORNER: str = _SURVEY + "Corner_Position"
+_TAG_PERCENTAGE_LIMIT: str = _SURVEY + "Percentage_Limit"
+_TAG_MAGLIMIT: str = _SURVEY + "limiting_magnitude"
+_TAG_SURVEY: str = _SURVEY + "Survey"
+_TAGS: FrozenSet[str] = frozenset((
+    _TAG_LID, _TAG_START, _TAG_STOP, _TAG_RA, _TAG_DEC, _TAG_CORNER_ID,
+    _TAG_CORNER, _TAG_PERCENTAGE_LIMIT, _TAG_MAGLIMIT, _TAG_SURVEY
+))
+
+# calibrated data labels in the file list
+_CALIBRATED_LABEL: re.Pattern = re.compile(rb"data_calibrated/[^\n]*\.xml$")
+
+# modified Julian date zero point
+_MJD_EPOCH: datetime = datetime(1858, 11, 17)
+
+# ISO 8601 date and time, with optional fractional seconds and UTC offset
+_ISO_TIME: re.Pattern = re.compile(
+    r"(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(\.\d*)?"
+    r"(?:Z|([+-])(\d\d):(\d\d))?$"
+)
+
+# image corners in field of view order
+_CORNERS: Dict[str, int] = {
+    "Top Left": 0,
+    "Top Right": 1,
+    "Bottom Right": 2,
+    "Bottom Left": 3,
+}
+
+
+def _read_lines(filename: str, size: int) -> Iterator[List[bytes]]:
+    """Read a file in ``size`` byte blocks, yielding the lines of each.
+
+    Lines do not include the newline character.
+
+    """
+
+    tail: bytes = b""
+    with open(filename, "rb") as inf:
+        while True:
+            block: bytes = inf.read(size)
+            if len(block) == 0:
+                break
+            lines: List[bytes] = (tail + block).split(b"\n")
+            # the last line may continue in the next block
+            tail = lines.pop()
+            yield lines
+
+    if len(tail) > 0:
+        yield [tail]
+
+
+def _read_cache(filename: str) -> Optional[bytes]:
+    """Read a gzipped label cache file, or ``None`` if it does not exist."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "rb") as inf:
+        return gzip.decompress(inf.read())
+
+
+def _write_cache(filename: str, data: bytes) -> None:
+    """Write a gzipped label cache file."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    # write, then rename, so that the cache is never partial
+    with open(filename + ".part", "wb") as outf:
+        outf.write(gzip.compress(data))
+    os.replace(filename + ".part", filename)
+
+
+def iso_to_mjd(date: str) -> float:
+    """Convert an ISO 8601 UTC time to modified Julian date.
+
+    Equivalent to ``astropy.time.Time(date).mjd``, but much faster.
+
+    """
+
+    # parsed by hand: before Python 3.11, fromisoformat accepts neither the Z
+    # suffix nor fractional seconds with other than 3 or 6 digits
+    m: Optional[re.Match] = _ISO_TIME.match(date.strip())
+    if m is None:
+        raise ValueError(f"Invalid ISO 8601 time: {date!r}")
+
+    d: datetime = datetime(*(int(x) for x in m.groups()[:6]))
+    seconds: float = (d - _MJD_EPOCH).total_seconds()
+    if m[7] is not None and len(m[7]) > 1:
+        seconds += float(m[7])
+    if m[8] is not None:
+        offset: int = int(m[9]) * 3600 + int(m[10]) * 60
+        seconds -= offset if m[8] == "+" else -offset
+    return seconds / 86400
+
+
+def validate_label(url: str) -> None:
+    """Read a label with pds4_tools to check that it is valid PDS4.
+
+    Much slower than ``parse_label``, so intended for spot checks.
+
+    Raises
+    ------
+    ValueError
+        If pds4_tools cannot parse the label.  Errors retrieving the label,
+        e.g., ``OSError``, are not converted.
+
+    """
+
+    try:
+        pds4_read(url, lazy_load=True, quiet=True)
+    except (ExpatError, PDS4StandardsException, ValueError) as e:
+        raise ValueError(f"Invalid label: {e}") from None
+
+
+def parse_label(label_bytes: bytes) -> Dict[str, Any]:
+    """Parse label into observation values.
+
+    The label is parsed in a single pass, discarding elements as soon as
+    they have been read.  Parsing stops as soon as all values have been
+    found, or at the end of the survey discipline area, so ``label_bytes``
+    may be a truncated label.
+
+    The values are returned as a plain dictionary, rather than a database
+    object, so that labels may be parsed in other processes.  ``ra`` and
+    ``dec`` are the image corners.
+
+    Raises
+    ------
+    ValueError
+        For incomplete labels.
+
+    SyntaxError
+        For malformed or truncated XML.
+
+    """
+
+    lid: Optional[str] = None
+    start: Optional[str] = None
+    stop: Optional[str] = None
+    ra: List[Optional[float]] = [None] * 4
+    dec: List[Optional[float]] = [None] * 4
+    maglimit: Optional[float] = None
+
+    # number of values not yet found: lid, start, stop, four corners, and
+    # the limiting magnitude
+    needed: int = 8
+
+    # values of the current Corner_Position and Percentage_Limit
+    corner: Dict[str, str] = {}
+    percentage: Optional[str] = None
+    limiting_magnitude: Optional[str] = None
+
+    event: str
+    elem: etree._Element
+    try:
+        for event, elem in etree.iterparse(BytesIO(label_bytes),
+                                           events=("end",)):
+            tag: str = elem.tag
+            if tag in _TAGS:
+                parent: etree._Element = elem.getparent()
+                if tag == _TAG_LID:
+                    if (parent.tag == _PDS + "Identification_Area"
+                            and lid is None):
+                        lid = elem.text
+                        needed -= 1
+                elif tag == _TAG_START:
+                    if parent.tag == _TAG_TIME and start is None:
+                        start = elem.text
+                        needed -= 1
+                elif tag == _TAG_STOP:
+                    if parent.tag == _TAG_TIME and stop is None:
+                        stop = elem.text
+                        needed -= 1
+                elif tag == _TAG_CORNER_ID:
+                    corner[tag] = elem.text
+                elif tag in (_TAG_RA, _TAG_DEC):
+                    # Corner_Position/Coordinate/right_ascension, etc.
+                    if parent.getparent().tag == _TAG_CORNER:
+                        corner[tag] = elem.text
+                elif tag == _TAG_CORNER:
+                    i: Optional[int] = _CORNERS.get(
+                        corner.get(_TAG_CORNER_ID))
+                    # a corner without coordinates is left unfilled
+                    if (i is not None and _TAG_RA in corner
+                            and _TAG_DEC in corner):
+                        if ra[i] is None:
+                            needed -= 1
+                        ra[i] = float(corner[_TAG_RA])
+                        dec[i] = float(corner[_TAG_DEC])
+                    corner = {}
+                elif tag == _TAG_SURVEY:
+                    # all values have been read, the limiting magnitude is
+                    # missing
+                    break
+                elif tag == _TAG_MAGLIMIT:
+                    limiting_magnitude = elem.text
+                elif len(elem) == 0:
+                    # the value of a Percentage_Limit
+                    percentage = elem.text
+                else:
+                    # end of a Percentage_Limit block
+                    if percentage == "50" and limiting_magnitude is not None:
+                        if maglimit is None:
+                            needed -= 1
+                        maglimit = float(limiting_magnitude)
+                    percentage = None
+                    limiting_magnitude = None
+
+                if needed == 0:
+                    # skip the rest of the label
+                    break
+
+            # free everything parsed so far
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        # lxml exceptions cannot be pickled for return from a process pool
+        raise SyntaxError(str(e)) from None
+
+    if None in (lid, start, stop) or None in ra or None in dec:
+        raise ValueError("Incomplete label")
+
+    mjd_start: float = iso_to_mjd(start)
+    mjd_stop: float = iso_to_mjd(stop)
+    return {
+        "product_id": lid,
+        "mjd_start": mjd_start,
+        "mjd_stop": mjd_stop,
+        "exposure": round((mjd_stop - mjd_start) * 86400, 3),
+        "maglimit": maglimit,
+        "ra": ra,
+        "dec": dec,
+    }
 
 
 class CSSChecker(SBSearch):
@@ -35,167 +293,559 @@ class CSSChecker(SBSearch):
     # local file list
     LIST_FILE: str = "css-file-list.txt"
 
-    def download_list_file(self) -> None:
-        """Check PDS archive for new data and save to file."""
-
-        download: bool = False
-
-        if os.path.exists(self.LIST_FILE):
-            # file exists, check for an update
-            last_download_date: datetime = datetime.fromtimestamp(
-                os.stat(self.LIST_FILE).st_mtime)
-            response: requests.Response = requests.head(self.LATEST_FILES)
-            try:
-                file_date: datetime = datetime(
-                    *email.utils.parsedate(response.headers['Last-Modified'])
-                )
-                if last_download_date < file_date:
-                    download = True
-                    self.logger.info('New file list available.')
-            except KeyError:
-                pass
-        else:
-            # file does not exist, download new file
-            download = True
-
-        if download:
-            with requests.get(self.LATEST_FILES, stream=True) as r:
+    # file list read block size in bytes
+    READ_SIZE: int = 8 * 1048576
+
+    # downloaded label cache directory, kept until a sync completes, or None
+    # to disable, e.g., "css-label-cache"
+    LABEL_CACHE: Optional[str] = None
+
+    # use a Bloom filter, rather than a set, to test for previously synced
+    # labels when the sync status table has at least this many rows;
+    # requires pybloomfiltermmap3
+    BLOOM_FILTER_MIN_SIZE: int = 10000000
+
+    # maximum number of concurrent label downloads
+    MAX_CONNECTIONS: int = 64
+
+    # number of download attempts per label, and the initial delay between
+    # attempts in seconds (doubled after each failure); at least 1 attempt
+    # is required
+    FETCH_RETRIES: int = 3
+    FETCH_BACKOFF: float = 1.0
+
+    # number of label parsing processes: 0 to parse in the main process, or
+    # None for the number of processors; parsing processes are spawned, so
+    # scripts calling sync must be guarded with if __name__ == "__main__"
+    MAX_PARSERS: Optional[int] = 0
+
+    # validate every Nth new label with pds4_tools, 1 to validate all labels,
+    # 0 to disable
+    VALIDATE_EVERY: int = 0
+
+    # number of bytes to request from the start of each label, enough to
+    # cover the identification and observation areas
+    LABEL_HEADER_SIZE: int = 16384
+
+    # file list download part size in bytes, and the maximum number of parts
+    # to download at once
+    DOWNLOAD_PART_SIZE: int = 8 * 1048576
+    MAX_DOWNLOADS: int = 4
+
+    # number of rows to insert into the database per transaction, by database
+    # dialect, and the default for others
+    BATCH_SIZES: Dict[str, int] = {
+        "postgresql": 1000,
+        "mysql": 50000,
+        "sqlite": 500,
+        "mssql": 900,
+    }
+    BATCH_SIZE: int = 10000
+
+    def _download_list_file_parts(self, filename: str, size: int,
+                                  validator: str) -> bool:
+        """Download the file list with parallel range requests.
+
+        Each request is conditional on ``validator``, the ETag or
+        Last-Modified header of the file list, so that all parts are from
+        the same version of the file.
+
+        Returns ``False`` if the server does not return partial content,
+        e.g., because the file was modified, in which case the file is
+        incomplete.
+
+        """
+
+        fd: int = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+                          0o644)
+
+        def download_part(start: int) -> bool:
+            end: int = min(start + self.DOWNLOAD_PART_SIZE, size) - 1
+            # byte ranges must refer to the uncompressed file
+            headers: Dict[str, str] = {"Range": f"bytes={start}-{end}",
+                                       "If-Range": validator,
+                                       "Accept-Encoding": "identity"}
+            with requests.get(self.LATEST_FILES, headers=headers,
+                              stream=True) as r:
                 r.raise_for_status()
-                with open(self.LIST_FILE, "wb") as f:
-                    chunk: bytearray
-                    for chunk in r.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                self.logger.info('Downloaded file list.')
+                if r.status_code != 206:
+                    return False
+                # in case the server ignored If-Range
+                if validator not in (r.headers.get("ETag"),
+                                     r.headers.get("Last-Modified")):
+                    return False
+
+                offset: int = start
+                chunk: bytes
+                for chunk in r.iter_content(chunk_size=1048576):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+
+            if offset != end + 1:
+                raise IOError(f"Incomplete download of bytes {start}-{end}")
+            return True
+
+        try:
+            try:
+                os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                # not available on this platform or file system
+                os.ftruncate(fd, size)
+
+            executor: ThreadPoolExecutor
+            with ThreadPoolExecutor(self.MAX_DOWNLOADS) as executor:
+                return all(executor.map(
+                    download_part, range(0, size, self.DOWNLOAD_PART_SIZE)))
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _write_response(response: requests.Response, filename: str) -> None:
+        """Stream the response content to a file."""
+        with open(filename, "wb") as f:
+            chunk: bytearray
+            for chunk in response.iter_content(chunk_size=8192):
+                f.write(chunk)
 
-                stat: os.stat_result = os.stat(self.LIST_FILE)
-                file_date = Time(stat.st_mtime, format='unix')
-                self.logger.info(f"  Size: {stat.st_size / 1048576:.2f} MiB")
-                self.logger.info(f"  Last modified: {file_date.iso}")
+    def download_list_file(self) -> None:
+        """Check PDS archive for new data and save to file."""
 
-                backup_file: str = self.LIST_FILE.replace(
-                    '.txt', file_date.isot[:16].replace('-', '').replace(':', ''))
-                os.system(f'cp {self.LIST_FILE} {backup_file}')
+        # only download the file if it has been updated since our copy;
+        # request it uncompressed so that Content-Length is the file size
+        # used for range requests
+        headers: Dict[str, str] = {"Accept-Encoding": "identity"}
+        exists: bool = os.path.exists(self.LIST_FILE)
+        if exists:
+            headers["If-Modified-Since"] = email.utils.formatdate(
+                os.stat(self.LIST_FILE).st_mtime, usegmt=True)
+
+        with requests.get(self.LATEST_FILES, headers=headers,
+                          stream=True) as r:
+            if r.status_code == 304:
+                return
+            r.raise_for_status()
+
+            if exists:
+                self.logger.info('New file list available.')
+
+            # write to a new file, rather than truncating the old one, which
+            # may be hard linked to a backup
+            partial_file: str = self.LIST_FILE + ".part"
+            size: int = int(r.headers.get("Content-Length", 0))
+
+            # If-Range requires a strong ETag or a Last-Modified date
+            validator: Optional[str] = r.headers.get("ETag")
+            if validator is None or validator.startswith("W/"):
+                validator = r.headers.get("Last-Modified")
+
+            # os.pwrite is not available on all platforms
+            if (r.headers.get("Accept-Ranges") == "bytes"
+                    and size > self.DOWNLOAD_PART_SIZE
+                    and validator is not None
+                    and hasattr(os, "pwrite")):
+                # parallel range requests are faster than this response
+                r.close()
+                if not self._download_list_file_parts(partial_file, size,
+                                                      validator):
+                    with requests.get(self.LATEST_FILES, stream=True) as r2:
+                        r2.raise_for_status()
+                        self._write_response(r2, partial_file)
+            else:
+                self._write_response(r, partial_file)
+
+        os.replace(partial_file, self.LIST_FILE)
+        self.logger.info('Downloaded file list.')
+
+        stat: os.stat_result = os.stat(self.LIST_FILE)
+        file_date: datetime = datetime.fromtimestamp(stat.st_mtime,
+                                                     timezone.utc)
+        self.logger.info(f"  Size: {stat.st_size / 1048576:.2f} MiB")
+        self.logger.info(f"  Last modified: {file_date:%Y-%m-%d %H:%M:%S}")
+
+        backup_file: str = self.LIST_FILE.replace(
+            '.txt', f"{file_date:%Y%m%dT%H%M}")
+        try:
+            os.link(self.LIST_FILE, backup_file)
+        except OSError:
+            shutil.copyfile(self.LIST_FILE, backup_file)
 
     def new_label_urls(self) -> None:
         """Iterator of new labels."""
         line_count: int = 0
         calibrated_count: int = 0
         processed_count: int = 0
-        with open(self.LIST_FILE, "r") as inf:
-            line: str
-            for line in inf:
-                line_count += 1
-                if re.match(".*data_calibrated/.*\.xml\n$", line):
-                    if "collection" in line:
-                        continue
+
+        # load all previously synced paths at once, rather than querying the
+        # database for each line
+        synced: Query = self.db.session.query(SyncStatus.path)
+        n_synced: int = synced.count()
+        known: Union[Set[str], "BloomFilter"]
+        exact: bool
+        if BloomFilter is not None and n_synced >= self.BLOOM_FILTER_MIN_SIZE:
+            # ~10 bits per path, rather than ~100 bytes for a set, but false
+            # positives must be checked with the database
+            known = BloomFilter(n_synced, 0.01)
+            known.update(row[0] for row in synced.yield_per(100000))
+            exact = False
+        else:
+            known = set(row[0] for row in synced.yield_per(100000))
+            exact = True
+
+        # new paths, in case of duplicate lines
+        new: Set[str] = set()
+
+        lines: List[bytes]
+        for lines in _read_lines(self.LIST_FILE, self.READ_SIZE):
+            line_count += len(lines)
+
+            # paths of this block to yield, and those that must be checked
+            # with the database
+            paths: List[str] = []
+            hits: Set[str] = set()
+            line: bytes
+            for line in lines:
+                if b"collection" in line:
+                    continue
+                if _CALIBRATED_LABEL.search(line):
                     calibrated_count += 1
-                    path: str = line.strip()
-                    path = path[line.find("gbo.ast.catalina.survey"):]
-                    processed: Union[None, SyncStatus] = (
-                        self.db.session.query(SyncStatus)
-                        .filter(SyncStatus.path == path)
-                        .first()
-                    )
-
-                    if processed is None:
-                        processed_count += 1
-                        yield self.ARCHIVE_PREFIX + path
+                    path: str = line.decode().strip()
+                    path = path[path.find("gbo.ast.catalina.survey"):]
+                    if path in new or path in hits:
+                        continue
+                    if path not in known:
+                        new.add(path)
+                    elif exact:
+                        continue
+                    else:
+                        hits.add(path)
+                    paths.append(path)
+
+            synced_hits: Set[str] = self._synced_paths(hits)
+            for path in paths:
+                if path in synced_hits:
+                    continue
+                new.add(path)
+                processed_count += 1
+                yield self.ARCHIVE_PREFIX + path
 
         self.logger.info("Processed:\n"
                          f"    {line_count} lines\n"
                          f"    {calibrated_count} calibrated data labels\n"
                          f"    {processed_count} new files\n")
 
-    def process_label(self, url: str) -> Observation:
-        """Download label, parse, and create database object."""
-
-        label: PDS4Label = pds4_read(url, lazy_load=True, quiet=True).label
-        lid: str = label.find("Identification_Area/logical_identifier").text
+    def _synced_paths(self, paths: Set[str]) -> Set[str]:
+        """Subset of ``paths`` that are in the sync status table."""
+        if len(paths) == 0:
+            return set()
+        return set(
+            row[0] for row in
+            self.db.session.query(SyncStatus.path)
+            .filter(SyncStatus.path.in_(paths))
+        )
 
-        tel: str = lid.split(":")[5][:3].upper()
-        if tel in CatalinaBigelow._telescopes:
-            obs = CatalinaBigelow()
-        elif tel in CatalinaLemmon._telescopes:
-            obs = CatalinaLemmon()
-        elif tel in CatalinaKittPeak._telescopes:
-            obs = CatalinaKittPeak()
-        else:
+    async def fetch_label_bytes(self, session: aiohttp.ClientSession,
+                                url: str, size: Optional[int] = None
+                                ) -> bytes:
+        """Download a label, retrying with exponential backoff.
+
+        If ``size`` is given, then only the first ``size`` bytes are
+        requested.  Servers may ignore the range and return the full label.
+
+        Downloads are saved to ``LABEL_CACHE``, if set, and read from there
+        on subsequent calls.
+
+        """
+
+        headers: Dict[str, str] = {}
+        if size is not None:
+            headers["Range"] = f"bytes=0-{size - 1}"
+
+        # cache files are read and written in a thread to avoid blocking
+        # the event loop
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        cache_file: Optional[str] = None
+        if self.LABEL_CACHE is not None:
+            key: str = hashlib.sha256(
+                f"{url} {headers.get('Range', '')}".encode()).hexdigest()
+            cache_file = os.path.join(self.LABEL_CACHE, key[:2], key)
+            cached: Optional[bytes] = await loop.run_in_executor(
+                None, _read_cache, cache_file)
+            if cached is not None:
+                return cached
+
+        if self.FETCH_RETRIES < 1:
+            raise ValueError("FETCH_RETRIES must be at least 1")
+
+        attempt: int
+        for attempt in range(self.FETCH_RETRIES):
+            try:
+                async with session.get(url, headers=headers,
+                                       raise_for_status=True) as response:
+                    label_bytes: bytes = await response.read()
+
+                if cache_file is not None:
+                    await loop.run_in_executor(
+                        None, _write_cache, cache_file, label_bytes)
+
+                return label_bytes
+            except aiohttp.ClientResponseError as e:
+                # do not retry client errors, e.g., 404
+                if e.status < 500 or attempt == self.FETCH_RETRIES - 1:
+                    raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.FETCH_RETRIES - 1:
+                    raise
+
+            delay: float = self.FETCH_BACKOFF * 2**attempt
+            self.logger.debug("Retrying %s in %.1f s", url, delay)
+            await asyncio.sleep(delay)
+
+    def create_observation(self, values: Dict[str, Any]) -> Observation:
+        """Create database object from parsed label values."""
+
+        tel: str = values["product_id"].split(":")[5][:3].upper()
+        cls: Optional[Type[Observation]] = _TEL_TO_CLS.get(tel)
+        if cls is None:
             raise ValueError(f"Unknown telescope {tel}")
 
-        obs.product_id = lid
-        obs.mjd_start = Time(
-            label.find("Observation_Area/Time_Coordinates/start_date_time").text
-        ).mjd
-        obs.mjd_stop = Time(
-            label.find("Observation_Area/Time_Coordinates/stop_date_time").text
-        ).mjd
-        obs.exposure = round((obs.mjd_stop - obs.mjd_start) * 86400, 3)
-
-        survey: ElementTree = label.find(".//survey:Survey")
-        ra: List[float] = []
-        dec: List[float] = []
-        corner: str
-        for corner in ("Top Left", "Top Right", "Bottom Right", "Bottom Left"):
-            coordinate: ElementTree = survey.find(
-                "survey:Image_Corners"
-                f"/survey:Corner_Position[survey:corner_identification='{corner}']"
-                "/survey:Coordinate"
-            )
-            ra.append(float(coordinate.find("survey:right_ascension").text))
-            dec.append(float(coordinate.find("survey:declination").text))
-        obs.set_fov(ra, dec)
-
-        maglimit: Union[ElementTree, None] = survey.find(
-            "survey:Limiting_Magnitudes"
-            "/survey:Percentage_Limit[survey:Percentage_Limit='50']"
-            "/survey:limiting_magnitude"
-        )
-        if maglimit is not None:
-            obs.maglimit = float(maglimit.text)
+        obs: Observation = cls()
+        obs.product_id = values["product_id"]
+        obs.mjd_start = values["mjd_start"]
+        obs.mjd_stop = values["mjd_stop"]
+        obs.exposure = values["exposure"]
+        obs.set_fov(values["ra"], values["dec"])
+        if values["maglimit"] is not None:
+            obs.maglimit = values["maglimit"]
 
         return obs
 
-    def sync(self) -> None:
-        """Sync local database with files available at PDS."""
-
-        self.download_list_file()
-
-        observations: List[Observation] = []
-        tri: ProgressTriangle = ProgressTriangle(1, logger=self.logger, base=2)
-        url: str
-        msg: str
-        failed: int = 0
-        for url in self.new_label_urls():
+    @staticmethod
+    async def _parse_label(executor: Optional[ProcessPoolExecutor],
+                           label_bytes: bytes) -> Dict[str, Any]:
+        """Parse label with ``executor``, or in this process if ``None``."""
+        if executor is None:
+            return parse_label(label_bytes)
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, parse_label, label_bytes)
+
+    async def _label_worker(self, session: aiohttp.ClientSession,
+                            semaphore: asyncio.BoundedSemaphore,
+                            executor: Optional[ProcessPoolExecutor],
+                            urls: asyncio.Queue,
+                            results: asyncio.Queue) -> None:
+        """Download and parse labels until the ``None`` sentinel arrives.
+
+        ``urls`` items are tuples of (url, validate), where validate is
+        ``True`` for labels to be checked with ``validate_label``.  Labels
+        are validated and parsed with ``executor``, or, if it is ``None``,
+        validated in a thread and parsed in this process.
+
+        Each result is a tuple of (url, observation or ``None``, message).
+        ``None`` is put on the results queue when the worker is done.
+
+        """
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        item: Union[Tuple[str, bool], None]
+        while True:
+            item = await urls.get()
+            if item is None:
+                break
+
+            url: str
+            validate: bool
+            url, validate = item
+            obs: Union[Observation, None] = None
             try:
-                observations.append(self.process_label(url))
+                if validate:
+                    await loop.run_in_executor(executor, validate_label, url)
+                async with semaphore:
+                    label_bytes: bytes = await self.fetch_label_bytes(
+                        session, url, size=self.LABEL_HEADER_SIZE)
+                values: Dict[str, Any]
+                try:
+                    values = await self._parse_label(executor, label_bytes)
+                except SyntaxError:
+                    if len(label_bytes) < self.LABEL_HEADER_SIZE:
+                        raise
+                    # required values are beyond the requested range
+                    async with semaphore:
+                        label_bytes = await self.fetch_label_bytes(
+                            session, url)
+                    values = await self._parse_label(executor, label_bytes)
+                obs = self.create_observation(values)
                 msg = "added"
             except ValueError as e:
-                failed += 1
                 msg = str(e)
-            except:
+            except Exception:
                 self.logger.error(
                     "A fatal error occurred processing %s", url, exc_info=True
                 )
                 raise
 
-            self.logger.debug("%s: %s", url, msg)
-            tri.update()
+            await results.put((url, obs, msg))
+
+        await results.put(None)
+
+    def _batch_size(self) -> int:
+        """Number of rows to insert per transaction for this database."""
+        dialect: str = self.db.session.get_bind().dialect.name
+        return self.BATCH_SIZES.get(dialect, self.BATCH_SIZE)
 
-            status = SyncStatus(
-                path=url[len(self.ARCHIVE_PREFIX):],
-                date=Time.now().iso,
-                status=msg
+    def _save_batch(self, observations: List[Observation],
+                    status_rows: List[Dict[str, str]],
+                    batch_size: int) -> None:
+        """Save observations and their sync status in one transaction."""
+
+        if len(status_rows) > 0:
+            # a Core insert, bypassing the ORM unit of work
+            self.db.session.execute(
+                SyncStatus.__table__.insert().execution_options(
+                    insertmanyvalues_page_size=batch_size),
+                status_rows
             )
-            self.db.session.add(status)
 
-            if len(observations) >= 10000:
-                self.add_observations(observations)
+        if len(observations) > 0:
+            self.add_observations(observations)
+
+        self.db.session.commit()
+
+        # saved objects are no longer needed, keep the identity map small
+        self.db.session.expunge_all()
+
+    async def _observation_writer(self, results: asyncio.Queue,
+                                  n_workers: int) -> int:
+        """Save parsed labels to the database.
+
+        Returns the number of labels that failed processing.
+
+        """
+
+        batch_size: int = self._batch_size()
+        observations: List[Observation] = []
+        status_rows: List[Dict[str, str]] = []
+        tri: ProgressTriangle = ProgressTriangle(1, logger=self.logger, base=2)
+        failed: int = 0
+        while n_workers > 0:
+            result: Union[Tuple[str, Union[Observation, None], str], None] = (
+                await results.get()
+            )
+            if result is None:
+                n_workers -= 1
+                continue
+
+            url: str
+            obs: Union[Observation, None]
+            msg: str
+            url, obs, msg = result
+            if obs is None:
+                failed += 1
+            else:
+                observations.append(obs)
+
+            self.logger.debug("%s: %s", url, msg)
+            tri.update()
+
+            status_rows.append({
+                "path": url[len(self.ARCHIVE_PREFIX):],
+                # same format as astropy.time.Time.now().iso
+                "date": datetime.now(timezone.utc).replace(tzinfo=None)
+                .isoformat(" ", "milliseconds"),
+                "status": msg,
+            })
+
+            # every label has a status row, so this also limits the number
+            # of observations
+            if len(status_rows) >= batch_size:
+                self._save_batch(observations, status_rows, batch_size)
                 observations = []
+                status_rows = []
 
         tri.log()
 
-        if len(observations) > 0:
-            self.add_observations(observations)
+        self._save_batch(observations, status_rows, batch_size)
+
+        return failed
+
+    async def _sync_labels(self) -> int:
+        """Concurrently download, parse, and save all new labels.
+
+        Returns the number of labels that failed processing.
+
+        """
+
+        # fail before any label is recorded with this error
+        if self.FETCH_RETRIES < 1:
+            raise ValueError("FETCH_RETRIES must be at least 1")
+
+        urls: asyncio.Queue = asyncio.Queue(maxsize=2 * self.MAX_CONNECTIONS)
+        results: asyncio.Queue = asyncio.Queue(
+            maxsize=2 * self.MAX_CONNECTIONS)
+        semaphore: asyncio.BoundedSemaphore = asyncio.BoundedSemaphore(
+            self.MAX_CONNECTIONS)
+        connector: aiohttp.TCPConnector = aiohttp.TCPConnector(
+            limit_per_host=self.MAX_CONNECTIONS)
+
+        async def produce() -> None:
+            i: int
+            url: str
+            for i, url in enumerate(self.new_label_urls()):
+                validate: bool = (self.VALIDATE_EVERY > 0
+                                  and i % self.VALIDATE_EVERY == 0)
+                await urls.put((url, validate))
+            for _ in range(self.MAX_CONNECTIONS):
+                await urls.put(None)
+
+        executor: Optional[ProcessPoolExecutor] = None
+        if self.MAX_PARSERS != 0:
+            # spawn, rather than fork, so that parsers do not inherit
+            # database connections
+            executor = ProcessPoolExecutor(
+                max_workers=self.MAX_PARSERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+        session: aiohttp.ClientSession
+        try:
+            async with aiohttp.ClientSession(connector=connector) as session:
+                workers: List[asyncio.Task] = [
+                    asyncio.create_task(
+                        self._label_worker(session, semaphore, executor, urls,
+                                           results))
+                    for _ in range(self.MAX_CONNECTIONS)
+                ]
+                writer: asyncio.Task = asyncio.create_task(
+                    self._observation_writer(results, len(workers)))
+                tasks: List[asyncio.Task] = [
+                    asyncio.create_task(produce()), *workers, writer]
+                try:
+                    await asyncio.gather(*tasks)
+                finally:
+                    task: asyncio.Task
+                    for task in tasks:
+                        task.cancel()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return writer.result()
+
+    def sync(self) -> None:
+        """Sync local database with files available at PDS.
+
+        If ``MAX_PARSERS`` is not 0, labels are parsed in spawned processes,
+        which import the calling script.  In that case, the script must call
+        ``sync`` from an ``if __name__ == "__main__":`` block.
+
+        """
+
+        self.download_list_file()
+
+        failed: int = asyncio.run(self._sync_labels())
+
+        # all labels are in the database, the cache is no longer needed
+        if self.LABEL_CACHE is not None and os.path.exists(self.LABEL_CACHE):
+            shutil.rmtree(self.LABEL_CACHE)
 
         if failed > 0:
             self.logger.warning("Failed processing %d files", failed)
@@ -1,6 +1,6 @@
 # Licensed with the 3-clause BSD license.  See LICENSE for details.
 
-from typing import List, Dict
+from typing import List, Dict, Tuple, Type
 from sqlalchemy import BigInteger, Column, String, ForeignKey
 from sbsearch.model import Base, Observation, Found, Ephemeris
 
@@ -18,20 +18,11 @@ _ARCHIVE_URL_PREFIX: str = (
     "https://sbnarchive.psi.edu/pds4/surveys/gbo.ast.catalina.survey/data_calibrated"
 )
 
-_month_to_Mon: Dict[str, str] = {
-    "01": "Jan",
-    "02": "Feb",
-    "03": "Mar",
-    "04": "Apr",
-    "05": "May",
-    "06": "Jun",
-    "07": "Jul",
-    "08": "Aug",
-    "09": "Sep",
-    "10": "Oct",
-    "11": "Nov",
-    "12": "Dec",
-}
+# month abbreviations, indexed by month number
+_MON: Tuple[str, ...] = (
+    "", "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+    "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"
+)
 
 
 class SyncStatus(Base):
@@ -57,17 +48,16 @@ class CatalinaSkySurvey:
         # generate from PDS4 LID, e.g.,
         # urn:nasa:pds:gbo.ast.catalina.survey:data_calibrated:703_20220120_2b_n02006_01_0001.arch
         # https://sbnarchive.psi.edu/pds4/surveys/gbo.ast.catalina.survey/data_calibrated/703/2022/22Jan20/703_20220120_2B_N02006_01_0001.arch.xml
-        lid: List[str] = self.product_id.split(":")
+        basename: str = self.product_id.split(":")[5]
         tel: str
         date: str
-        tel, date = lid[5].split("_")[:2]
-        year: str = date[:4]
-        Mon: str = _month_to_Mon[date[4:6]]
-        day: str = date[6:]
-        i: int = lid[5].find(".")
-        prefix: str = lid[5][:i].upper()
-        suffix: str = lid[5][i:].lower() + ".fz"
-        return f"{_ARCHIVE_URL_PREFIX}/{tel.upper()}/{year}/{year[-2:]}{Mon}{day}/{prefix}{suffix}"
+        tel, date = basename.split("_", 2)[:2]
+        i: int = basename.find(".")
+        return (
+            f"{_ARCHIVE_URL_PREFIX}/{tel.upper()}/{date[:4]}/"
+            f"{date[2:4]}{_MON[int(date[4:6])]}{date[6:]}/"
+            f"{basename[:i].upper()}{basename[i:].lower()}.fz"
+        )
 
     def cutout_url(
         self, ra: float, dec: float, size: float = 0.0833, format: str = "fits"
@@ -166,3 +156,11 @@ class CatalinaKittPeak(Observation, CatalinaSkySurvey):
     product_id = Column(
         String(128), doc="Archive product id", unique=True, index=True, nullable=False
     )
+
+
+# MPC telescope code to observation class
+_TEL_TO_CLS: Dict[str, Type[Observation]] = {
+    tel: cls
+    for cls in (CatalinaBigelow, CatalinaLemmon, CatalinaKittPeak)
+    for tel in cls._telescopes
+}
@@ -0,0 +1,498 @@
+# Licensed with the 3-clause BSD license.  See LICENSE for details.
+
+import os
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+import aiohttp
+from aiohttp import web
+from astropy.time import Time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from .. import core
+from ..core import (CSSChecker, _read_lines, iso_to_mjd, parse_label,
+                    validate_label)
+from ..model import CatalinaBigelow, CatalinaLemmon, SyncStatus
+
+# corners are not in field of view order, the 50% limit is not first, and
+# there is a start_date_time outside of Time_Coordinates
+LABEL: str = """<?xml version="1.0" encoding="UTF-8"?>
+<Product_Observational xmlns="http://pds.nasa.gov/pds4/pds/v1"
+    xmlns:survey="http://pds.nasa.gov/pds4/survey/v1">
+  <Identification_Area>
+    <logical_identifier>urn:nasa:pds:gbo.ast.catalina.survey:data_calibrated:703_20220120_2b_n02006_01_0001.arch</logical_identifier>
+    <Modification_History>
+      <Modification_Detail>
+        <modification_date>2022-02-01</modification_date>
+      </Modification_Detail>
+    </Modification_History>
+  </Identification_Area>
+  <Observation_Area>
+    <Time_Coordinates>
+      <start_date_time>2022-01-20T03:04:05.123Z</start_date_time>
+      <stop_date_time>2022-01-20T03:04:35.123Z</stop_date_time>
+    </Time_Coordinates>
+    <Investigation_Area>
+      <start_date_time>2000-01-01T00:00:00Z</start_date_time>
+    </Investigation_Area>
+    <Discipline_Area>
+      <survey:Survey>
+        <survey:Image_Corners>
+          <survey:Corner_Position>
+            <survey:Coordinate>
+              <survey:right_ascension unit="deg">10.0</survey:right_ascension>
+              <survey:declination unit="deg">1.0</survey:declination>
+            </survey:Coordinate>
+            <survey:corner_identification>Top Right</survey:corner_identification>
+          </survey:Corner_Position>
+          <survey:Corner_Position>
+            <survey:corner_identification>Bottom Left</survey:corner_identification>
+            <survey:Coordinate>
+              <survey:right_ascension unit="deg">11.0</survey:right_ascension>
+              <survey:declination unit="deg">2.0</survey:declination>
+            </survey:Coordinate>
+          </survey:Corner_Position>
+          <survey:Corner_Position>
+            <survey:Coordinate>
+              <survey:right_ascension unit="deg">11.0</survey:right_ascension>
+              <survey:declination unit="deg">1.0</survey:declination>
+            </survey:Coordinate>
+            <survey:corner_identification>Top Left</survey:corner_identification>
+          </survey:Corner_Position>
+          <survey:Corner_Position>
+            <survey:Coordinate>
+              <survey:right_ascension unit="deg">10.0</survey:right_ascension>
+              <survey:declination unit="deg">2.0</survey:declination>
+            </survey:Coordinate>
+            <survey:corner_identification>Bottom Right</survey:corner_identification>
+          </survey:Corner_Position>
+        </survey:Image_Corners>
+        <survey:Limiting_Magnitudes>
+          <survey:Percentage_Limit>
+            <survey:Percentage_Limit>90</survey:Percentage_Limit>
+            <survey:limiting_magnitude unit="mag">19.5</survey:limiting_magnitude>
+          </survey:Percentage_Limit>
+          <survey:Percentage_Limit>
+            <survey:Percentage_Limit>50</survey:Percentage_Limit>
+            <survey:limiting_magnitude unit="mag">20.5</survey:limiting_magnitude>
+          </survey:Percentage_Limit>
+          <survey:Percentage_Limit>
+            <survey:Percentage_Limit>10</survey:Percentage_Limit>
+            <survey:limiting_magnitude unit="mag">21.5</survey:limiting_magnitude>
+          </survey:Percentage_Limit>
+        </survey:Limiting_Magnitudes>
+      </survey:Survey>
+    </Discipline_Area>
+  </Observation_Area>
+</Product_Observational>
+"""
+
+
+def test_parse_label():
+    values: Dict = parse_label(LABEL.encode())
+    assert values["product_id"] == (
+        "urn:nasa:pds:gbo.ast.catalina.survey:data_calibrated:"
+        "703_20220120_2b_n02006_01_0001.arch"
+    )
+    assert values["mjd_start"] == pytest.approx(59599.12783707176, abs=1e-9)
+    assert values["exposure"] == 30.0
+    assert values["ra"] == [11.0, 10.0, 10.0, 11.0]
+    assert values["dec"] == [1.0, 1.0, 2.0, 2.0]
+    assert values["maglimit"] == 20.5
+
+
+def test_parse_label_no_maglimit():
+    label: str = LABEL.replace(
+        "<survey:Percentage_Limit>50<", "<survey:Percentage_Limit>40<")
+    assert parse_label(label.encode())["maglimit"] is None
+
+
+def test_parse_label_incomplete():
+    label: str = LABEL.replace("<start_date_time>", "<xstart_date_time>")
+    label = label.replace("</start_date_time>", "</xstart_date_time>")
+    with pytest.raises(ValueError):
+        parse_label(label.encode())
+
+    # a corner without coordinates
+    i: int = LABEL.index("<survey:Coordinate>")
+    j: int = LABEL.index("</survey:Coordinate>") + len("</survey:Coordinate>")
+    label = LABEL[:i] + LABEL[j:]
+    with pytest.raises(ValueError):
+        parse_label(label.encode())
+
+
+def test_parse_label_truncated():
+    # header ends before the survey area
+    label: bytes = LABEL.encode()
+    with pytest.raises(SyntaxError):
+        parse_label(label[:label.index(b"<survey:Survey>") + 20])
+
+    # header ends after all values have been found
+    i: int = label.index(b"<survey:Percentage_Limit>10")
+    values: Dict = parse_label(label[:i])
+    assert values["maglimit"] == 20.5
+
+
+@pytest.mark.parametrize("suffix", ["", "Z"])
+@pytest.mark.parametrize("date", [
+    "2022-01-20T03:04:05",
+    "2022-01-20T03:04:05.12",
+    "2022-01-20T03:04:05.123",
+    "2022-01-20T03:04:05.1234",
+    "2022-01-20T03:04:05.123456",
+])
+def test_iso_to_mjd(date, suffix):
+    assert iso_to_mjd(date + suffix) == pytest.approx(Time(date).mjd,
+                                                      abs=1e-10)
+
+
+def test_iso_to_mjd_invalid():
+    with pytest.raises(ValueError):
+        iso_to_mjd("2022-01-20 03:04:05")
+
+
+def test_validate_label(tmp_path):
+    fn = tmp_path / "label.xml"
+    fn.write_text(LABEL[:LABEL.index("<Observation_Area>")])
+    with pytest.raises(ValueError):
+        validate_label(str(fn))
+
+    # errors reading the label are not label errors
+    with pytest.raises(OSError):
+        validate_label(str(tmp_path / "missing.xml"))
+
+
+@pytest.mark.parametrize("size", [1, 3, 8 * 1048576])
+@pytest.mark.parametrize("data", [b"ab\ncd\n\nefg\n", b"ab\ncd\n\nefg"])
+def test_read_lines(tmp_path, size, data):
+    fn = str(tmp_path / "list.txt")
+    with open(fn, "wb") as outf:
+        outf.write(data)
+
+    lines: List[bytes] = [line for block in _read_lines(fn, size)
+                          for line in block]
+    assert lines == [b"ab", b"cd", b"", b"efg"]
+
+
+def _old_archive_url(product_id: str) -> str:
+    # archive_url before it was cached and simplified
+    month_to_Mon: Dict[str, str] = {
+        "01": "Jan", "02": "Feb", "03": "Mar", "04": "Apr", "05": "May",
+        "06": "Jun", "07": "Jul", "08": "Aug", "09": "Sep", "10": "Oct",
+        "11": "Nov", "12": "Dec",
+    }
+    lid: List[str] = product_id.split(":")
+    tel, date = lid[5].split("_")[:2]
+    year: str = date[:4]
+    Mon: str = month_to_Mon[date[4:6]]
+    day: str = date[6:]
+    i: int = lid[5].find(".")
+    prefix: str = lid[5][:i].upper()
+    suffix: str = lid[5][i:].lower() + ".fz"
+    return (
+        "https://sbnarchive.psi.edu/pds4/surveys/gbo.ast.catalina.survey/"
+        f"data_calibrated/{tel.upper()}/{year}/{year[-2:]}{Mon}{day}/"
+        f"{prefix}{suffix}"
+    )
+
+
+@pytest.mark.parametrize("cls,basename", [
+    (CatalinaBigelow, "703_20220120_2b_n02006_01_0001.arch"),
+    (CatalinaLemmon, "g96_20211205_2b_f54x3_01_0004.arch"),
+    (CatalinaLemmon, "i52_20191031_4a_n10030_01_0012.arch"),
+])
+def test_archive_url(cls, basename):
+    obs = cls(product_id=(
+        f"urn:nasa:pds:gbo.ast.catalina.survey:data_calibrated:{basename}"))
+    assert obs.archive_url == _old_archive_url(obs.product_id)
+
+
+def test_archive_url_product_id_changed():
+    obs = CatalinaBigelow(product_id=(
+        "urn:nasa:pds:gbo.ast.catalina.survey:data_calibrated:"
+        "703_20220120_2b_n02006_01_0001.arch"))
+    obs.archive_url
+    obs.product_id = obs.product_id.replace("0001.arch", "0002.arch")
+    assert obs.archive_url.endswith("0002.arch.fz")
+
+
+def _checker(**attributes) -> CSSChecker:
+    """CSSChecker without a database, with class attributes overridden."""
+    checker: CSSChecker = CSSChecker.__new__(CSSChecker)
+    checker.db = None
+    checker.logger = logging.getLogger("CSS-Checker")
+    name: str
+    for name, value in attributes.items():
+        setattr(checker, name, value)
+    return checker
+
+
+@pytest.fixture
+def file_server(tmp_path):
+    """Serve files from a temporary directory in a background thread.
+
+    Yields the directory and its URL.
+
+    """
+
+    root = tmp_path / "server"
+    root.mkdir()
+
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_static("/", str(root))
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port: int = runner.addresses[0][1]
+
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{port}/"
+
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.run_until_complete(runner.cleanup())
+    loop.close()
+
+
+def _file_list(n: int) -> bytes:
+    return b"".join(
+        f"./gbo.ast.catalina.survey/data_calibrated/703/{i:06d}.xml\n".encode()
+        for i in range(n)
+    )
+
+
+def _list_checker(server_url: str, tmp_path, **attributes) -> CSSChecker:
+    (tmp_path / "local").mkdir(exist_ok=True)
+    return _checker(LATEST_FILES=server_url + "list.txt",
+                    LIST_FILE=str(tmp_path / "local" / "css-file-list.txt"),
+                    **attributes)
+
+
+def test_download_list_file(file_server, tmp_path):
+    root, url = file_server
+    data: bytes = _file_list(100)
+    (root / "list.txt").write_bytes(data)
+
+    checker: CSSChecker = _list_checker(url, tmp_path)
+    checker.download_list_file()
+    with open(checker.LIST_FILE, "rb") as inf:
+        assert inf.read() == data
+
+    # the partial file was renamed, and the backup is a hard link
+    files: List[str] = sorted(os.listdir(tmp_path / "local"))
+    assert len(files) == 2
+    assert files[0] == "css-file-list.txt"
+    assert os.path.samefile(checker.LIST_FILE,
+                            str(tmp_path / "local" / files[1]))
+
+
+def test_download_list_file_not_modified(file_server, tmp_path):
+    root, url = file_server
+    (root / "list.txt").write_bytes(_file_list(10))
+    stat: os.stat_result = os.stat(root / "list.txt")
+    os.utime(root / "list.txt", (stat.st_atime, stat.st_mtime - 10))
+    checker: CSSChecker = _list_checker(url, tmp_path)
+    checker.download_list_file()
+
+    # the server's copy is older than ours: 304, and the file is untouched
+    inode: int = os.stat(checker.LIST_FILE).st_ino
+    checker.download_list_file()
+    assert os.stat(checker.LIST_FILE).st_ino == inode
+    assert not os.path.exists(checker.LIST_FILE + ".part")
+
+
+def test_download_list_file_parts(file_server, tmp_path, monkeypatch):
+    root, url = file_server
+    data: bytes = _file_list(1000)
+    (root / "list.txt").write_bytes(data)
+
+    parts: List[bool] = []
+    original = CSSChecker._download_list_file_parts
+
+    def download_parts(self, *args):
+        parts.append(original(self, *args))
+        return parts[-1]
+
+    monkeypatch.setattr(CSSChecker, "_download_list_file_parts",
+                        download_parts)
+    checker: CSSChecker = _list_checker(url, tmp_path,
+                                        DOWNLOAD_PART_SIZE=1000,
+                                        MAX_DOWNLOADS=4)
+    checker.download_list_file()
+    assert parts == [True]
+    with open(checker.LIST_FILE, "rb") as inf:
+        assert inf.read() == data
+
+
+def test_download_list_file_parts_modified(file_server, tmp_path,
+                                           monkeypatch):
+    root, url = file_server
+    (root / "list.txt").write_bytes(_file_list(1000))
+    data: bytes = _file_list(1100)
+
+    parts: List[bool] = []
+    original = CSSChecker._download_list_file_parts
+
+    def download_parts(self, *args):
+        # the file list is replaced after the first request
+        (root / "list.txt").write_bytes(data)
+        stat: os.stat_result = os.stat(root / "list.txt")
+        os.utime(root / "list.txt", (stat.st_atime, stat.st_mtime + 10))
+        parts.append(original(self, *args))
+        return parts[-1]
+
+    monkeypatch.setattr(CSSChecker, "_download_list_file_parts",
+                        download_parts)
+    checker: CSSChecker = _list_checker(url, tmp_path,
+                                        DOWNLOAD_PART_SIZE=1000,
+                                        MAX_DOWNLOADS=4)
+    checker.download_list_file()
+
+    # the range requests failed, and the new file was downloaded in full
+    assert parts == [False]
+    with open(checker.LIST_FILE, "rb") as inf:
+        assert inf.read() == data
+
+
+async def _fetch(checker: CSSChecker,
+                 calls: List[Tuple[str, Optional[int]]]
+                 ) -> Tuple[List, Counter]:
+    """Fetch labels from a local server, in order.
+
+    ``calls`` are (path, size) arguments for ``fetch_label_bytes``.
+    ``/flaky`` fails twice with 503, ``/missing`` is 404, and any other path
+    returns its own path and requested range.
+
+    Returns the labels, or exceptions, and request counts by path.
+
+    """
+
+    requests: Counter = Counter()
+
+    async def handler(request):
+        requests[request.path] += 1
+        if request.path == "/missing":
+            raise web.HTTPNotFound()
+        if request.path == "/flaky" and requests[request.path] < 3:
+            raise web.HTTPServiceUnavailable()
+        return web.Response(body=(
+            f"{request.path} {request.headers.get('Range')}").encode())
+
+    app = web.Application()
+    app.router.add_get("/{path}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url: str = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    labels: List = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            path: str
+            size: Optional[int]
+            for path, size in calls:
+                try:
+                    labels.append(await checker.fetch_label_bytes(
+                        session, url + path, size))
+                except Exception as e:
+                    labels.append(e)
+    finally:
+        await runner.cleanup()
+    return labels, requests
+
+
+def test_fetch_label_bytes_retry():
+    checker: CSSChecker = _checker(FETCH_BACKOFF=0.01)
+    labels, requests = asyncio.run(
+        _fetch(checker, [("/flaky", 10), ("/missing", 10)]))
+
+    # server errors are retried, client errors are not
+    assert labels[0] == b"/flaky bytes=0-9"
+    assert requests["/flaky"] == 3
+    assert isinstance(labels[1], aiohttp.ClientResponseError)
+    assert labels[1].status == 404
+    assert requests["/missing"] == 1
+
+    # too many server errors
+    checker.FETCH_RETRIES = 2
+    labels, requests = asyncio.run(_fetch(checker, [("/flaky", None)]))
+    assert isinstance(labels[0], aiohttp.ClientResponseError)
+    assert labels[0].status == 503
+    assert requests["/flaky"] == 2
+
+
+def test_fetch_label_bytes_no_retries():
+    checker: CSSChecker = _checker(FETCH_RETRIES=0)
+    labels, requests = asyncio.run(_fetch(checker, [("/label", None)]))
+    assert isinstance(labels[0], ValueError)
+    assert len(requests) == 0
+
+
+def test_fetch_label_bytes_cache(tmp_path):
+    checker: CSSChecker = _checker(LABEL_CACHE=str(tmp_path / "cache"))
+    labels, requests = asyncio.run(_fetch(checker, [
+        ("/label", 10), ("/label", None), ("/label", 10), ("/label", None)
+    ]))
+
+    # ranged and full labels are cached separately, and cache hits skip the
+    # network
+    assert labels == [b"/label bytes=0-9", b"/label None"] * 2
+    assert requests["/label"] == 2
+
+
+@pytest.mark.parametrize("bloom", [False, True])
+def test_new_label_urls(tmp_path, bloom):
+    if bloom and core.BloomFilter is None:
+        pytest.skip("requires pybloomfilter")
+
+    engine = create_engine("sqlite://")
+    SyncStatus.__table__.create(engine)
+    session: Session = Session(engine)
+    prefix: str = "gbo.ast.catalina.survey/data_calibrated/703/"
+    session.add_all([
+        SyncStatus(sync_id=i, path=f"{prefix}{i:06d}.xml", date="2022-01-01",
+                   status="added")
+        for i in range(0, 100, 2)
+    ])
+    session.commit()
+
+    # synced and new labels, duplicates, collections, and other files
+    fn = tmp_path / "css-file-list.txt"
+    with open(fn, "w") as outf:
+        i: int
+        for i in range(100):
+            outf.write(f"./{prefix}{i:06d}.xml\n")
+            outf.write(f"./{prefix}{i:06d}.fits\n")
+        outf.write(f"./{prefix}collection_703.xml\n")
+        outf.write(f"./{prefix}000001.xml\n")
+        outf.write(f"./{prefix}000002.xml\n")
+
+    checker: CSSChecker = _checker(
+        db=SimpleNamespace(session=session),
+        LIST_FILE=str(fn),
+        ARCHIVE_PREFIX="https://localhost/",
+        READ_SIZE=1000,
+        BLOOM_FILTER_MIN_SIZE=0 if bloom else 1000000,
+    )
+    # count paths checked with the database
+    checked: List[int] = []
+    synced_paths = checker._synced_paths
+    checker._synced_paths = lambda paths: (
+        checked.append(len(paths)) or synced_paths(paths))
+
+    urls: List[str] = list(checker.new_label_urls())
+    assert urls == [f"https://localhost/{prefix}{i:06d}.xml"
+                    for i in range(1, 100, 2)]
+
+    # Bloom filter hits include all synced paths
+    assert (sum(checked) >= 50) == bloom